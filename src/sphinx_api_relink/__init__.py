@@ -1,32 +1,26 @@
 # pyright: reportAttributeAccessIssue=false
 from __future__ import annotations
 
+import filecmp
+import os
 import shutil
-from importlib.metadata import version
+import tempfile
+from functools import lru_cache
+from importlib.machinery import EXTENSION_SUFFIXES
 from pathlib import Path
 from typing import TYPE_CHECKING, Any
 
-import sphinx.domains.python
-from docutils import nodes
-from sphinx.addnodes import pending_xref, pending_xref_condition
-from sphinx.ext.apidoc import main as sphinx_apidoc
-
-from sphinx_api_relink.linkcode import get_linkcode_resolve
-
-__SPHINX_VERSION = tuple(int(i) for i in version("sphinx").split(".") if i.isdigit())
-if __SPHINX_VERSION < (7, 3):
-    from sphinx.domains.python import parse_reftarget  # type:ignore[attr-defined]
-else:
-    from sphinx.domains.python._annotations import (  # type:ignore[import-not-found,no-redef]
-        parse_reftarget,  # noqa: PLC2701
-    )
-
 if TYPE_CHECKING:
+    from docutils import nodes
     from docutils.parsers.rst.states import Inliner
+    from sphinx.addnodes import pending_xref
     from sphinx.application import Sphinx
     from sphinx.environment import BuildEnvironment
     from sphinx.util.typing import RoleFunction
 
+# Same as sphinx.ext.apidoc.PY_SUFFIXES, without importing sphinx-apidoc
+_PYTHON_SUFFIXES = (".py", ".pyx", *EXTENSION_SUFFIXES)
+
 
 def setup(app: Sphinx) -> dict[str, Any]:
     app.add_config_value("api_github_repo", default=None, rebuild="env")
@@ -51,8 +45,12 @@ def set_linkcode_resolve(app: Sphinx, _: BuildEnvironment) -> None:
     github_repo: str | None = app.config.api_github_repo
     if github_repo is None:
         return
+    from sphinx_api_relink.linkcode import get_linkcode_resolve  # noqa: PLC0415
+
     debug: bool = app.config.api_linkcode_debug
-    app.config.linkcode_resolve = get_linkcode_resolve(github_repo, debug)  # type:ignore[attr-defined]
+    url_cache_file = Path(app.doctreedir) / "api_relink_urls.json"
+    linkcode_resolve = get_linkcode_resolve(github_repo, debug, url_cache_file)
+    app.config.linkcode_resolve = linkcode_resolve  # type:ignore[attr-defined]
     app.setup_extension("sphinx.ext.linkcode")
 
 
@@ -62,149 +60,302 @@ def generate_apidoc(app: Sphinx, _: BuildEnvironment) -> None:
     if package_path is None:
         return
     apidoc_dir = Path(app.srcdir) / app.config.generate_apidoc_directory
-    shutil.rmtree(apidoc_dir, ignore_errors=True)
     if isinstance(package_path, str):
         package_dirs = [package_path]
     else:
         package_dirs = package_path
+    stamp_file = apidoc_dir / ".apidoc_stamp"
+    stamp = _create_apidoc_stamp(app, package_dirs)
+    if stamp_file.exists() and stamp_file.read_text() == stamp:
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rel_dir in package_dirs:
+            abs_package_path = Path(app.srcdir) / rel_dir
+            _run_sphinx_apidoc(
+                abs_package_path,
+                Path(tmp_dir),
+                excludes=app.config.generate_apidoc_excludes,
+                use_compwa_template=app.config.generate_apidoc_use_compwa_template,
+            )
+        _sync_directory(Path(tmp_dir), apidoc_dir)
+    stamp_file.write_text(stamp)
+
+
+def _sync_directory(source_dir: Path, target_dir: Path) -> None:
+    """Copy the files of the source directory, but only overwrite files that changed.
+
+    Unchanged files keep their modification time, so that Sphinx does not have to
+    read them again. Anything in the target directory that is not in the source
+    directory is removed.
+    """
+    target_dir.mkdir(parents=True, exist_ok=True)
+    source_files = {path.name: path for path in source_dir.iterdir() if path.is_file()}
+    for path in target_dir.iterdir():
+        if path.name in source_files and path.is_file():
+            continue
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+    for name, source_file in source_files.items():
+        target_file = target_dir / name
+        if target_file.exists() and filecmp.cmp(
+            source_file, target_file, shallow=False
+        ):
+            continue
+        shutil.copyfile(source_file, target_file)
+
+
+def _create_apidoc_stamp(app: Sphinx, package_dirs: list[str]) -> str:
+    """Summarize the apidoc input, so that unchanged packages can be skipped.
+
+    The stamp contains the Sphinx and extension versions, the configuration and
+    templates that affect the output of :code:`sphinx-apidoc` and, per package
+    directory, the relative paths and modification times of its Python files, so
+    that added, removed, and modified modules are detected. Files that are excluded
+    from the API, like a :file:`version.py` that is rewritten on every install, are
+    ignored.
+    """
+    from sphinx import __version__ as sphinx_version  # noqa: PLC0415
+
+    excludes: list[str] = app.config.generate_apidoc_excludes or []
+    use_compwa_template: bool = app.config.generate_apidoc_use_compwa_template
+    lines = [
+        f"sphinx: {sphinx_version}",
+        f"sphinx-api-relink: {_get_extension_version()}",
+        f"excludes: {app.config.generate_apidoc_excludes}",
+        f"use_compwa_template: {use_compwa_template}",
+    ]
+    if use_compwa_template:
+        lines.extend(
+            f"templates/{template.name}: {template.stat().st_mtime_ns}"
+            for template in sorted(_get_template_dir().iterdir())
+        )
     for rel_dir in package_dirs:
         abs_package_path = Path(app.srcdir) / rel_dir
-        _run_sphinx_apidoc(
-            abs_package_path,
-            apidoc_dir,
-            excludes=app.config.generate_apidoc_excludes,
-            use_compwa_template=app.config.generate_apidoc_use_compwa_template,
+        if not abs_package_path.is_dir():
+            lines.append(f"{rel_dir}: -1")
+            continue
+        excluded_paths = {
+            os.path.normpath(abs_package_path / file)
+            for file in [*excludes, "version.py"]
+        }
+        python_files = _get_python_files(abs_package_path, excluded_paths)
+        lines.extend(
+            f"{rel_dir}/{rel_path}: {mtime}" for rel_path, mtime in sorted(python_files)
         )
+    return "\n".join(lines) + "\n"
+
+
+def _get_extension_version() -> str:
+    from importlib.metadata import PackageNotFoundError, version  # noqa: PLC0415
+
+    try:
+        return version("sphinx-api-relink")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def _get_template_dir() -> Path:
+    return Path(__file__).parent / "templates"
+
+
+def _get_python_files(
+    directory: Path | str, excluded_paths: set[str], rel_dir: str = ""
+) -> list[tuple[str, int]]:
+    """Get the relative paths and modification times (ns) of all Python files.
+
+    Python files are recognized by the same suffixes as :code:`sphinx-apidoc` uses,
+    including Cython and compiled extension modules. Hidden directories and
+    :file:`__pycache__` directories are skipped.
+    """
+    python_files: list[tuple[str, int]] = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if os.path.normpath(entry.path) in excluded_paths:
+                continue
+            rel_path = f"{rel_dir}{entry.name}"
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name == "__pycache__" or entry.name.startswith("."):
+                    continue
+                python_files.extend(
+                    _get_python_files(entry.path, excluded_paths, f"{rel_path}/")
+                )
+            elif entry.name.endswith(_PYTHON_SUFFIXES):
+                python_files.append((rel_path, entry.stat().st_mtime_ns))
+    return python_files
 
 
 def _run_sphinx_apidoc(
     package_path: Path,
-    apidoc_dir: str = "api",
+    apidoc_dir: Path | str = "api",
     excludes: list[str] | None = None,
     use_compwa_template: bool = True,
 ) -> None:
+    from sphinx.ext.apidoc import main as sphinx_apidoc  # noqa: PLC0415
+
     if not package_path.exists():
         msg = f"Package under {package_path} does not exist"
         raise FileNotFoundError(msg)
-    args: list[str] = [str(package_path)]
-    if excludes is None:
-        excludes = []
+    package_dir = str(package_path)
+    with os.scandir(package_dir) as entries:
+        package_entries = {entry.name for entry in entries}
+    args: list[str] = [package_dir]
+    excludes = list(excludes or ())
     version_file = "version.py"
-    if (package_path / version_file).exists():
+    if version_file in package_entries:
         excludes.append(version_file)
     for file in excludes:
-        excluded_path = package_path / file
-        if not excluded_path.exists():
+        excluded_path = os.path.join(package_dir, file)
+        if file not in package_entries and not os.path.exists(excluded_path):
             msg = f"Excluded file {excluded_path} does not exist"
             raise FileNotFoundError(msg)
-        args.append(str(package_path / file))
-    args.extend(f"-o {apidoc_dir} --force --no-toc --separate".split())
+        args.append(excluded_path)
+    args.extend(["-o", str(apidoc_dir), "--force", "--no-toc", "--separate"])
     if use_compwa_template:
-        template_dir = Path(__file__).parent / "templates"
-        args.extend(f"--templatedir {template_dir}".split())
+        args.extend(["--templatedir", str(_get_template_dir())])
     sphinx_apidoc(args)
 
 
 def replace_type_to_xref(app: Sphinx, _: BuildEnvironment) -> None:
-    target_substitutions = _get_target_substitutions(app)
-    ref_targets = {
-        k: v if isinstance(v, str) else v[1] for k, v in target_substitutions.items()
-    }
-    ref_types = _get_target_types(app)
-    ref_types.update({
-        v[1]: v[0] for v in target_substitutions.values() if isinstance(v, tuple)
-    })
+    import sphinx.domains.python  # noqa: PLC0415
+    from docutils import nodes  # noqa: PLC0415
+    from sphinx.addnodes import pending_xref, pending_xref_condition  # noqa: PLC0415
+
+    try:
+        from sphinx.domains.python._annotations import (  # type:ignore[import-not-found]  # noqa: PLC0415
+            parse_reftarget,
+        )
+    except ImportError:  # Sphinx <7.3
+        from sphinx.domains.python import (  # type:ignore[attr-defined,no-redef]  # noqa: PLC0415
+            parse_reftarget,
+        )
+
+    ref_targets, ref_types = _compile_substitutions(app)
+    get_ref_target = ref_targets.get
+    get_ref_type = ref_types.get
+    create_xref = pending_xref
+    create_condition = pending_xref_condition
+    create_text = nodes.Text
+    use_unqualified_type_names: bool = app.config.python_use_unqualified_type_names
+    # parse_reftarget returns an immutable tuple of str and bool, so it can be shared
+    cached_parse_reftarget = lru_cache(maxsize=8192)(parse_reftarget)
+
+    def _create_nodes(title: str) -> list[nodes.Node]:
+        short_name = _get_short_name(title)
+        if use_unqualified_type_names:
+            return [
+                create_condition("", short_name, condition="resolved"),
+                create_condition("", title, condition="*"),
+            ]
+        return [create_text(short_name)]
 
     def _new_type_to_xref(
         target: str,
         env: BuildEnvironment | None = None,  # type:ignore[assignment]
         suppress_prefix: bool = False,
     ) -> pending_xref:
-        reftype, target, title, refspecific = parse_reftarget(target, suppress_prefix)
-        target = ref_targets.get(target, target)
-        reftype = ref_types.get(target, reftype)
+        reftype, target, title, refspecific = cached_parse_reftarget(
+            target, suppress_prefix
+        )
+        target = get_ref_target(target, target)
+        reftype = get_ref_type(target, reftype)
         if env is None:
             msg = "Environment cannot be None"
             raise TypeError(msg)
-        return pending_xref(
+        ref_context = env.ref_context
+        return create_xref(
             "",
-            *_create_nodes(env, title),
+            *_create_nodes(title),
             refdomain="py",
             reftype=reftype,
             reftarget=target,
             refspecific=refspecific,
-            **_get_env_kwargs(env),
+            **{
+                "py:module": ref_context.get("py:module"),
+                "py:class": ref_context.get("py:class"),
+            },
         )
 
-    if __SPHINX_VERSION < (7, 3):
-        sphinx.domains.python.type_to_xref = _new_type_to_xref  # pyright:ignore[reportPrivateImportUsage]
-    else:
+    # The replacement is installed even if there are no substitutions, because it
+    # also renders type hints by their short name (see _create_nodes)
+    if hasattr(sphinx.domains.python, "_annotations"):
         sphinx.domains.python._annotations.type_to_xref = _new_type_to_xref  # noqa: SLF001
+    else:
+        sphinx.domains.python.type_to_xref = _new_type_to_xref  # pyright:ignore[reportPrivateImportUsage]
 
 
-def _get_target_substitutions(app: Sphinx) -> dict[str, str | tuple[str, str]]:
+def _compile_substitutions(app: Sphinx) -> tuple[dict[str, str], dict[str, str]]:
+    """Validate the :code:`api_target_*` config values and create the lookup tables.
+
+    Returns a mapping of type hints to their reference targets and a mapping of
+    reference targets to their reference types. Both are built in the same pass
+    that validates the config values.
+    """
+    target_substitutions = _get_config_dict(app, "api_target_substitutions")
+    target_types = _get_config_dict(app, "api_target_types")
+    config_key = "api_target_types"
+    ref_types: dict[str, str] = {}
+    for k, v in target_types.items():
+        if not isinstance(k, str):
+            msg = f"{config_key} keys must be str, got {type(k).__name__} for key {k!r}"
+            raise TypeError(msg)
+        if not isinstance(v, str):
+            msg = (
+                f"{config_key} values must be str, got {type(v).__name__} for key {k!r}"
+            )
+            raise TypeError(msg)
+        ref_types[k] = v
     config_key = "api_target_substitutions"
-    target_substitutions = getattr(app.config, config_key, {})
-    if not isinstance(target_substitutions, dict):
-        msg = f"{config_key} must be a dict, got {type(target_substitutions).__name__}"
-        raise TypeError(msg)
+    ref_targets: dict[str, str] = {}
     for k, v in target_substitutions.items():
         if not isinstance(k, str):
             msg = f"{config_key} keys must be str, got {type(k).__name__}"
             raise TypeError(msg)
-        if not isinstance(v, (str, tuple)):
+        if isinstance(v, str):
+            ref_targets[k] = v
+        elif isinstance(v, tuple):
+            if len(v) != 2:  # noqa: PLR2004
+                msg = (
+                    f"If dict values of {config_key} are a tuple, they must have"
+                    f" length 2, but got {len(v)} for key {k!r}"
+                )
+                raise TypeError(msg)
+            reftype, target = v
+            ref_targets[k] = target
+            ref_types[target] = reftype
+        else:
             msg = (
                 f"{config_key} values must be str or a tuple, got"
                 f" {type(v).__name__} for key {k!r}"
             )
             raise TypeError(msg)
-        if isinstance(v, tuple) and len(v) != 2:  # noqa: PLR2004
-            msg = (
-                f"If dict values of {config_key} are a tuple, they must have length 2,"
-                f" but got {len(v)} for key {k!r}"
-            )
-            raise TypeError(msg)
-    return target_substitutions
+    return ref_targets, ref_types
 
 
-def _get_target_types(app: Sphinx) -> dict[str, str]:
-    config_key = "api_target_types"
-    target_types = getattr(app.config, config_key, {})
-    if not isinstance(target_types, dict):
-        msg = f"{config_key} must be a dict, got {type(target_types).__name__}"
+def _get_config_dict(app: Sphinx, config_key: str) -> dict:
+    config_value = getattr(app.config, config_key, {})
+    if not isinstance(config_value, dict):
+        msg = f"{config_key} must be a dict, got {type(config_value).__name__}"
         raise TypeError(msg)
-    for k, v in target_types.items():
-        if not isinstance(k, str):
-            msg = f"{config_key} keys must be str, got {type(k).__name__} for key {k!r}"
-            raise TypeError(msg)
-        if not isinstance(v, str):
-            msg = (
-                f"{config_key} values must be str, got {type(v).__name__} for key {k!r}"
-            )
-            raise TypeError(msg)
-    return target_types
+    return config_value
 
 
-def _get_env_kwargs(env: BuildEnvironment) -> dict:
-    if env:
-        return {
-            "py:module": env.ref_context.get("py:module"),
-            "py:class": env.ref_context.get("py:class"),
-        }
-    return {}
+@lru_cache(maxsize=4096)
+def _get_short_name(title: str) -> str:
+    # Only the name is cached: docutils nodes are mutable and cannot be shared
+    return title[title.rfind(".") + 1 :]
 
 
-def _create_nodes(env: BuildEnvironment, title: str) -> list[nodes.Node]:
-    short_name = title.split(".")[-1]
-    if env.config.python_use_unqualified_type_names:
-        return [
-            pending_xref_condition("", short_name, condition="resolved"),
-            pending_xref_condition("", title, condition="*"),
-        ]
-    return [nodes.Text(short_name)]
+def wiki_role(pattern: str) -> RoleFunction:
+    from docutils import nodes  # noqa: PLC0415
 
+    url_prefix, _, url_suffix = pattern.partition("%s")
+    # Concatenation only equals pattern % (text,) if %s is the only % directive
+    is_simple_pattern = pattern.count("%") == 1 and "%s" in pattern
+    underscore_to_space = str.maketrans("_", " ")
+    create_reference = nodes.reference
 
-def wiki_role(pattern: str) -> RoleFunction:
     def role(  # noqa: PLR0913, PLR0917
         name: str,  # noqa: ARG001
         rawtext: str,
@@ -214,12 +365,14 @@ def wiki_role(pattern: str) -> RoleFunction:
         options: dict | None = None,
         content: list[str] | None = None,  # noqa: ARG001
     ) -> tuple[list[nodes.Node], list[nodes.system_message]]:
-        output_text = text
-        output_text = output_text.replace("_", " ")
-        url = pattern % (text,)
+        output_text = text.translate(underscore_to_space)
+        if is_simple_pattern:
+            url = url_prefix + text + url_suffix
+        else:
+            url = pattern % (text,)
         if options is None:
             options = {}
-        reference_node = nodes.reference(rawtext, output_text, refuri=url, **options)
+        reference_node = create_reference(rawtext, output_text, refuri=url, **options)
         return [reference_node], []
 
     return role  # type:ignore[return-value]
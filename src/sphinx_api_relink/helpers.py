@@ -6,35 +6,59 @@ from __future__ import annotations
 import os
 import re
 import sys
-from functools import cache
+from functools import cache, lru_cache
 from importlib.metadata import PackageNotFoundError, version
+from typing import Any, NoReturn
 
 from colorama import Fore, Style
 
 __DEFAULT_BRANCH = "main"
 __VERSION_REMAPPING: dict[str, dict[str, str]] = {}
+__CONSTRAINT_PATTERN = re.compile(
+    rb"^[ \t]*([A-Za-z0-9._-]+)[ \t]*(?:\[[^\]]*\])?[ \t]*==[ \t]*([^\s;#]+)",
+    flags=re.MULTILINE,
+)
+__CONSTRAINTS_FILE = (
+    f"../.constraints/py{sys.version_info.major}.{sys.version_info.minor}.txt"
+)
+__MAJOR_MINOR_PATTERN = re.compile(r"^([0-9]+\.[0-9]+).*$")
+__PRINTED_MESSAGES: set[str] = set()
 
 
+@cache
 def get_branch_name() -> str:
     """Get the branch name from the environment for GitHub or Read the Docs.
 
     See https://docs.readthedocs.io/en/stable/builds.html and
     https://docs.github.com/en/actions/learn-github-actions/variables.
+
+    The result is cached, so changes to the environment variables after the first
+    call are not taken into account.
     """
     branch_name = os.environ.get("READTHEDOCS_VERSION")
     if branch_name == "latest":
         return __DEFAULT_BRANCH
     if branch_name is None:
         branch_name = os.environ.get("GITHUB_REF", __DEFAULT_BRANCH)
-        branch_name = branch_name.replace("refs/heads/", "")
-        branch_name = branch_name.replace("refs/pull/", "")
-        branch_name = branch_name.replace("refs/tags/", "")
-        if re.match(r"^\d+/[a-z]+$", branch_name) is not None:
-            branch_name = __DEFAULT_BRANCH  # PR preview
+        for prefix in ("refs/heads/", "refs/pull/", "refs/tags/"):
+            branch_name = branch_name.removeprefix(prefix)
+        if _is_pr_preview(branch_name):
+            branch_name = __DEFAULT_BRANCH
     print_once(f"Linking pages to this Git ref: {branch_name}", color=Fore.MAGENTA)
     return branch_name
 
 
+def _is_pr_preview(ref: str) -> bool:
+    """Check whether a Git ref looks like :code:`<PR number>/merge`."""
+    pr_number, _, suffix = ref.partition("/")
+    return (
+        pr_number.isdigit()
+        and suffix.isascii()
+        and suffix.isalpha()
+        and suffix.islower()
+    )
+
+
 def get_execution_mode() -> str:
     if "FORCE_EXECUTE_NB" in os.environ:
         print("\033[93;1mWill run ALL Jupyter notebooks!\033[0m")  # noqa: T201
@@ -46,7 +70,9 @@ def get_execution_mode() -> str:
 
 def get_package_version(package_name: str) -> str:
     """Get the version (MAJOR.MINOR.PATCH) of a Python package."""
-    v = version(package_name)
+    v = _get_installed_version(package_name)
+    if v is None:
+        raise PackageNotFoundError(package_name)
     return ".".join(v.split(".")[:3])
 
 
@@ -54,49 +80,63 @@ def pin(
     package_name: str, version_remapping: dict[str, dict[str, str]] | None = None
 ) -> str:
     if version_remapping is None:
-        version_remapping = __VERSION_REMAPPING
-    package_name = package_name.lower()
+        return _pin(package_name.lower())
+    return _resolve_pin(package_name.lower(), version_remapping)
+
+
+@cache
+def _pin(package_name: str) -> str:
+    return _resolve_pin(package_name, __VERSION_REMAPPING)
+
+
+def _resolve_pin(
+    package_name: str, version_remapping: dict[str, dict[str, str]]
+) -> str:
     installed_version = _get_version_from_constraints(package_name)
     if installed_version is None:
-        try:
-            installed_version = version(package_name)
-        except PackageNotFoundError:
-            return "stable"
+        installed_version = _get_installed_version(package_name)
+    if installed_version is None:
+        return "stable"
     remapped_versions = version_remapping.get(package_name)
-    if remapped_versions is None:
+    if not remapped_versions:
         return installed_version
     return remapped_versions.get(installed_version, installed_version)
 
 
 def _get_version_from_constraints(package_name: str) -> str | None:
-    python_version = f"{sys.version_info.major}.{sys.version_info.minor}"
-    constraints_path = f"../.constraints/py{python_version}.txt"
+    constraints_path = os.path.abspath(__CONSTRAINTS_FILE)
+    constraints = _load_constraints(constraints_path)
+    return constraints.get(package_name)
+
+
+@lru_cache(maxsize=1)
+def _load_constraints(constraints_path: str) -> dict[str, str]:
+    """Map lower-case package names to their pinned versions in a constraints file."""
     if not os.path.exists(constraints_path):
-        return None
-    with open(constraints_path) as stream:
+        return {}
+    with open(constraints_path, "rb") as stream:
         constraints = stream.read()
-    package_name = package_name.lower()
-    for line in constraints.split("\n"):
-        line = line.split("#")[0]  # remove comments
-        line = line.strip()
-        line = line.lower()
-        if not line.startswith(package_name):
-            continue
-        if not line:
-            continue
-        line_segments = tuple(line.split("=="))
-        if len(line_segments) != 2:  # noqa: PLR2004
-            continue
-        _, installed_version, *_ = line_segments
-        return installed_version.strip()
-    return None
+    pinned_versions: dict[str, str] = {}
+    for match in __CONSTRAINT_PATTERN.finditer(constraints):
+        package_name = match[1].decode().lower()
+        pinned_versions.setdefault(package_name, match[2].decode().lower())
+    return pinned_versions
+
 
+@cache
+def _get_installed_version(package_name: str) -> str | None:
+    try:
+        return version(package_name)
+    except PackageNotFoundError:
+        return None
 
+
+@cache
 def pin_minor(package_name: str) -> str:
     installed_version = pin(package_name)
     if installed_version == "stable":
         return installed_version
-    matches = re.match(r"^([0-9]+\.[0-9]+).*$", installed_version)
+    matches = __MAJOR_MINOR_PATTERN.match(installed_version)
     if matches is None:
         msg = f"Could not find documentation for {package_name} v{installed_version}"
         raise ValueError(msg)
@@ -106,6 +146,23 @@ def pin_minor(package_name: str) -> str:
 def set_intersphinx_version_remapping(
     version_remapping: dict[str, dict[str, str]],
 ) -> None:
+    if not _is_version_remapping(version_remapping):
+        _raise_version_remapping_error(version_remapping)
+    __VERSION_REMAPPING.update(version_remapping)
+    _pin.cache_clear()
+    pin_minor.cache_clear()
+
+
+def _is_version_remapping(version_remapping: Any) -> bool:
+    return isinstance(version_remapping, dict) and all(
+        isinstance(k, str)
+        and isinstance(v, dict)
+        and all(isinstance(k2, str) and isinstance(v2, str) for k2, v2 in v.items())
+        for k, v in version_remapping.items()
+    )
+
+
+def _raise_version_remapping_error(version_remapping: Any) -> NoReturn:
     if not isinstance(version_remapping, dict):
         msg = (
             "intersphinx_relink_versions must be a dict, got a"
@@ -138,10 +195,13 @@ def set_intersphinx_version_remapping(
                     f" got a {type(v2).__name__}"
                 )
                 raise TypeError(msg)
-    __VERSION_REMAPPING.update(version_remapping)
+    msg = "intersphinx_relink_versions must be a dict[str, dict[str, str]]"
+    raise TypeError(msg)
 
 
-@cache
 def print_once(message: str, *, color: str = Fore.RED) -> None:
+    if message in __PRINTED_MESSAGES:
+        return
+    __PRINTED_MESSAGES.add(message)
     colored_text = f"{color}{message}{Style.RESET_ALL}"
     print(colored_text)  # noqa: T201
@@ -3,9 +3,16 @@
 from __future__ import annotations
 
 import inspect
+import json
+import os
 import subprocess
 import sys
-from functools import cache, lru_cache
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from functools import cache, lru_cache, reduce
 from os.path import dirname, relpath
 from typing import TYPE_CHECKING, Any, Callable, TypedDict
 from urllib.parse import quote
@@ -16,8 +23,12 @@ from colorama import Fore
 from sphinx_api_relink.helpers import print_once
 
 if TYPE_CHECKING:
+    from pathlib import Path
     from types import ModuleType
 
+__THREAD_LOCAL = threading.local()
+__URL_CACHE_TTL = 24 * 60 * 60  # seconds
+
 
 class LinkcodeInfo(TypedDict, total=True):
     module: str
@@ -25,13 +36,13 @@ class LinkcodeInfo(TypedDict, total=True):
 
 
 def get_linkcode_resolve(
-    github_repo: str, debug: bool
+    github_repo: str, debug: bool, url_cache_file: Path | None = None
 ) -> Callable[[str, LinkcodeInfo], str | None]:
     def linkcode_resolve(domain: str, info: LinkcodeInfo) -> str | None:
         path = _get_path(domain, info, debug)
         if path is None:
             return None
-        blob_url = get_blob_url(github_repo)
+        blob_url = get_blob_url(github_repo, url_cache_file)
         if debug:
             msg = f"  {info['fullname']} --> {blob_url}/src/{path}"
             print_once(msg, color=Fore.BLUE)
@@ -45,7 +56,7 @@ def _get_path(domain: str, info: LinkcodeInfo, debug: bool) -> str | None:
     if obj is None:
         return None
     try:
-        source_file = inspect.getsourcefile(obj)
+        source_file = _get_source_file(obj)
     except TypeError:
         if debug:
             msg = f"  Cannot source file for {info['fullname']!r} of type {type(obj)}"
@@ -54,16 +65,45 @@ def _get_path(domain: str, info: LinkcodeInfo, debug: bool) -> str | None:
     if not source_file:
         return None
 
-    module_name = info["module"]
+    package_root_dir = _get_package_root_dir(info["module"])
+    path = quote(relpath(source_file, start=package_root_dir))
+    source, start_lineno = _get_source_lines(obj)
+    end_lineno = start_lineno + len(source) - 1
+    linenumbers = f"L{start_lineno}-L{end_lineno}"
+    return f"{path}#{linenumbers}"
+
+
+def _get_source_file(obj: Any) -> str | None:
+    if not _is_hashable(obj):
+        return inspect.getsourcefile(obj)
+    return __get_source_file(obj)
+
+
+def _get_source_lines(obj: Any) -> tuple[list[str], int]:
+    if not _is_hashable(obj):
+        return inspect.getsourcelines(obj)
+    return __get_source_lines(obj)
+
+
+__get_source_file = lru_cache(maxsize=4096)(inspect.getsourcefile)
+__get_source_lines = lru_cache(maxsize=4096)(inspect.getsourcelines)
+
+
+def _is_hashable(obj: Any) -> bool:
+    try:
+        hash(obj)
+    except TypeError:
+        return False
+    return True
+
+
+@cache
+def _get_package_root_dir(module_name: str) -> str:
     main_module_path = _get_package(module_name).__file__
     if main_module_path is None:
         msg = f"Could not find file for module {module_name!r}"
         raise ValueError(msg)
-    path = quote(relpath(source_file, start=dirname(dirname(main_module_path))))
-    source, start_lineno = inspect.getsourcelines(obj)
-    end_lineno = start_lineno + len(source) - 1
-    linenumbers = f"L{start_lineno}-L{end_lineno}"
-    return f"{path}#{linenumbers}"
+    return dirname(dirname(main_module_path))
 
 
 @cache
@@ -93,6 +133,8 @@ def __get_object(domain: str, info: LinkcodeInfo) -> Any | None:
     if obj is None:
         print_once(f"Module {module_name} does not contain {fullname}")
         return None
+    if not hasattr(obj, "__wrapped__"):
+        return obj
     return inspect.unwrap(obj)
 
 
@@ -101,9 +143,10 @@ def _get_object_from_module(module_name: str, fullname: str) -> Any | None:
     name_parts = fullname.split(".")
     if len(name_parts) == 1:
         return getattr(module, fullname, None)
-    obj: Any = module
-    for sub_attr in name_parts[:-1]:
-        obj = getattr(obj, sub_attr, None)
+    try:
+        obj = reduce(getattr, name_parts[:-1], module)
+    except AttributeError:
+        obj = None
     if obj is None:
         print_once(f"Module {module_name} does not contain {fullname}")
         return None
@@ -111,60 +154,193 @@ def _get_object_from_module(module_name: str, fullname: str) -> Any | None:
 
 
 @lru_cache(maxsize=1)
-def get_blob_url(github_repo: str) -> str:
-    ref = _get_commit_sha()
+def get_blob_url(github_repo: str, url_cache_file: Path | None = None) -> str:
+    """Get the URL of the GitHub tree for the current commit, or for a fallback ref.
+
+    If a cache file is given, URLs that were found to exist in previous builds are
+    not checked again, and newly found URLs are added to it.
+    """
+    if url_cache_file is None:
+        return _find_blob_url(github_repo, _url_exists)
+    cached_urls = _load_url_cache(url_cache_file)
+    existing_urls = dict(cached_urls)
+
+    def url_exists(url: str) -> bool:
+        if url in existing_urls:
+            return True
+        if not _url_exists(url):
+            return False
+        existing_urls[url] = time.time()
+        return True
+
+    blob_url = _find_blob_url(github_repo, url_exists)
+    if existing_urls != cached_urls:
+        try:
+            _write_atomically(url_cache_file, json.dumps(existing_urls, indent=2))
+        except OSError:
+            print_once(f"Could not write {url_cache_file}", color=Fore.MAGENTA)
+    return blob_url
+
+
+def _find_blob_url(github_repo: str, url_exists: Callable[[str], bool]) -> str:
+    commit_sha = _get_commit_sha()
     repo_url = f"https://github.com/{github_repo}"
-    blob_url = f"{repo_url}/blob/{ref}"
-    if _url_exists(blob_url):
-        return blob_url
-    print_once(f"The URL {blob_url} seems not to exist", color=Fore.MAGENTA)
-    tag = _get_latest_tag()
-    if tag is not None:
-        blob_url = f"{repo_url}/blob/{tag}"
+    if commit_sha is None:
+        print_once("Could not determine the Git commit", color=Fore.MAGENTA)
+    else:
+        blob_url = f"{repo_url}/blob/{commit_sha}"
+        if url_exists(blob_url):
+            return blob_url
+        print_once(f"The URL {blob_url} seems not to exist", color=Fore.MAGENTA)
+    refs = [ref for ref in (_get_latest_tag(), "main") if ref is not None]
+    blob_urls = [f"{repo_url}/blob/{ref}" for ref in refs]
+    for blob_url, exists in zip(blob_urls, _urls_exist(blob_urls, url_exists)):
         print_once(f"--> falling back to {blob_url}", color=Fore.MAGENTA)
-        if _url_exists(blob_url):
+        if exists:
             return blob_url
-    blob_url = f"{repo_url}/blob/main"
-    print_once(f"--> falling back to {blob_url}", color=Fore.MAGENTA)
-    if _url_exists(blob_url):
-        return blob_url
     blob_url = f"{repo_url}/blob/master"
     print_once(f"--> falling back to {blob_url}", color=Fore.MAGENTA)
     return blob_url
 
 
-@lru_cache(maxsize=1)
-def _get_commit_sha() -> str:
-    result = subprocess.run(  # noqa: S603
-        ["git", "rev-parse", "HEAD"],  # noqa: S607
-        capture_output=True,
-        check=True,
-        text=True,
-    )
-    commit_hash = result.stdout.strip()
-    return commit_hash[:7]
+def _urls_exist(urls: list[str], url_exists: Callable[[str], bool]) -> list[bool]:
+    """Check whether fallback URLs exist, sending the requests concurrently.
+
+    The results are in the same order as the URLs, so that the caller can pick the
+    first URL that exists without waiting for each failed request in turn.
+    """
+    if len(urls) <= 1:
+        return [url_exists(url) for url in urls]
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        return list(executor.map(url_exists, urls))
+
+
+def _get_commit_sha() -> str | None:
+    commit_hash, _ = _get_git_refs()
+    return commit_hash
 
 
 def _get_latest_tag() -> str | None:
+    _, tag = _get_git_refs()
+    return tag
+
+
+@lru_cache(maxsize=1)
+def _get_git_refs() -> tuple[str | None, str | None]:
+    """Get the short commit SHA of :code:`HEAD` and a tag that points to it.
+
+    Both are extracted from the output of a single :code:`git log` call, instead of
+    calling :code:`git rev-parse` and :code:`git describe` separately. Signatures
+    and colors are switched off and only tags are decorated, so that user
+    configuration like :code:`log.showSignature` does not affect the output.
+    """
+    output = _run_git(
+        "log",
+        "-1",
+        "--no-color",
+        "--no-show-signature",
+        "--decorate=short",
+        "--decorate-refs=refs/tags/",
+        "--format=%H%n%D",
+    )
+    if output is None:
+        return None, None
+    commit_hash, _, ref_names = output.partition("\n")
+    tag_prefix = "tag: "
+    for ref_name in ref_names.strip().split(", "):
+        if ref_name.startswith(tag_prefix):
+            return commit_hash.strip()[:7], ref_name[len(tag_prefix) :]
+    return commit_hash.strip()[:7], None
+
+
+def _run_git(*args: str) -> str | None:
+    """Run a :code:`git` command and return its output or `None` if it failed.
+
+    Optional locks are disabled, so that :code:`git` does not try to refresh the
+    index of the repository.
+    """
     try:
-        result = subprocess.check_output(  # noqa: S603
-            ["git", "describe", "--tags", "--exact-match"],  # noqa: S607
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
+        result = subprocess.run(  # noqa: S603
+            ["git", *args],  # noqa: S607
+            capture_output=True,
+            check=True,
+            env={**os.environ, "GIT_OPTIONAL_LOCKS": "0"},
+            stdin=subprocess.DEVNULL,
+            text=True,
         )
-
-        return result.strip()
-    except subprocess.CalledProcessError:
+    except (OSError, subprocess.CalledProcessError):
         return None
+    return result.stdout.strip()
 
 
 @cache
 def _url_exists(url: str) -> bool:
     try:
-        response = requests.head(url, timeout=5)
-        redirect_url = response.headers.get("Location")
-        if redirect_url is None:
-            return response.status_code < 400  # noqa: PLR2004
-        return _url_exists(redirect_url)
+        response = _get_session().head(url, timeout=5, allow_redirects=True)
     except requests.RequestException:
         return False
+    return response.ok
+
+
+def _get_session() -> requests.Session:
+    """Get a :class:`requests.Session` for the current thread.
+
+    Sessions are not guaranteed to be thread-safe, so each thread gets its own.
+    """
+    session: requests.Session | None = getattr(__THREAD_LOCAL, "session", None)
+    if session is None:
+        session = requests.Session()
+        __THREAD_LOCAL.session = session
+    return session
+
+
+def _load_url_cache(cache_file: Path) -> dict[str, float]:
+    """Load the URLs that were found to exist in previous builds.
+
+    Only URLs that exist are stored, so that a commit that has not yet been pushed is
+    checked again in the next build. Entries older than a day are ignored.
+    """
+    try:
+        cached_urls = json.loads(cache_file.read_text())
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cached_urls, dict):
+        return {}
+    now = time.time()
+    return {
+        url: timestamp
+        for url, timestamp in cached_urls.items()
+        if isinstance(timestamp, (int, float)) and now - timestamp < __URL_CACHE_TTL
+    }
+
+
+def _write_atomically(path: Path, content: str) -> None:
+    """Write a file through a temporary file, so that it is never partially written.
+
+    Parallel Sphinx workers may write the same file, but :func:`os.replace` makes
+    sure that readers see either the old or the new content.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, tmp_path = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(file_descriptor, "w") as stream:
+            stream.write(content)
+        os.chmod(tmp_path, 0o666 & ~_get_umask())  # mkstemp creates it with 0o600
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+@cache
+def _get_umask() -> int:
+    """Get the file mode creation mask of the process.
+
+    The mask can only be read by setting it, so it is read only once.
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask